@@ -0,0 +1,175 @@
+from __future__ import annotations
+from typing import Optional, Tuple, List, Any
+
+import atexit
+import queue
+import threading
+
+import Log as _Log
+
+# A front end to the Log package which adds log levels and moves the writing of Log.txt and Log Error.txt onto a background thread.
+#   Messages are passed as a sequence of pieces which are str()ed and concatenated, e.g. LogDebug("Virtual=", virtual)
+#   The pieces are only formatted if the message's level is enabled, so a disabled debug message costs almost nothing.
+#   LogSetHeader() is lazy, too: the header is only formatted when a message is actually logged under it.
+# Errors are always logged.
+# Code which calls the Log package directly (e.g., F3Page and HelpersPackage) is routed through here as well -- see the end of the file.
+
+DEBUG=10
+INFO=20
+ERROR=40
+
+logLevel=INFO
+
+_queue: queue.Queue=queue.Queue()
+_writer: Optional[threading.Thread]=None
+_lock=threading.Lock()
+_pendingHeader: Optional[Tuple[Any, ...]]=None
+_captured: Optional[List[Tuple]]=None
+_inWrite=threading.local()     # Set while the Log package itself is being called, so its own internal calls aren't routed back to us
+
+# The Log package's own functions, which do the actual writing
+_LogPackageLog=_Log.Log
+_LogPackageSetHeader=_Log.LogSetHeader
+
+
+def SetLogLevel(level: int) -> None:
+    global logLevel
+    logLevel=level
+
+
+def LogEnabled(level: int) -> bool:
+    return level >= logLevel
+
+
+def LogOpen(logfilename: str, errorfilename: str) -> None:
+    global _writer
+    _Log.LogOpen(logfilename, errorfilename)
+    if _writer is None:
+        _writer=threading.Thread(target=_WriteLog, name="Log writer", daemon=True)
+        _writer.start()
+        atexit.register(LogClose)
+
+
+# Log at info level (or error level if isError is set)
+def Log(*pieces: Any, isError: bool=False, noNewLine: bool=False) -> None:
+    _Enqueue(ERROR if isError else INFO, pieces, isError, noNewLine)
+
+
+def LogDebug(*pieces: Any) -> None:
+    if logLevel > DEBUG:      # Checked here as well as in _Enqueue so the commonest case is as cheap as possible
+        return
+    _Enqueue(DEBUG, pieces, False, False)
+
+
+def LogSetHeader(*pieces: Any) -> None:
+    global _pendingHeader
+    with _lock:
+        _pendingHeader=pieces
+
+
+# Drop a header which hasn't been used, so it doesn't turn up above some later, unrelated message
+def LogClearHeader() -> None:
+    global _pendingHeader
+    with _lock:
+        _pendingHeader=None
+
+
+def LogClose() -> None:
+    global _writer
+    if _writer is not None:
+        _queue.put(None)
+        _writer.join()
+        _writer=None
+
+
+# A worker process can't write to the log files, so it captures its messages instead and hands them back to be replayed by LogReplay()
+# This also keeps the log in the same order as if the work had been done serially.
+def LogStartCapture() -> None:
+    global _captured
+    with _lock:
+        _captured=[]
+
+
+def LogEndCapture() -> List[Tuple]:
+    global _captured
+    with _lock:
+        captured=_captured if _captured is not None else []
+        _captured=None
+    return captured
+
+
+def LogReplay(captured: List[Tuple]) -> None:
+    with _lock:
+        for item in captured:
+            _Put(item)
+
+
+def _Format(pieces: Tuple[Any, ...]) -> str:
+    if len(pieces) == 1 and type(pieces[0]) is str:
+        return pieces[0]
+    return "".join(str(p) for p in pieces)
+
+
+def _Enqueue(level: int, pieces: Tuple[Any, ...], isError: bool, noNewLine: bool) -> None:
+    global _pendingHeader
+    if not LogEnabled(level):
+        return
+    with _lock:
+        if _pendingHeader is not None:
+            _Put(("header", _Format(_pendingHeader)))
+            _pendingHeader=None
+        _Put(("log", _Format(pieces), isError, noNewLine))
+
+
+def _Put(item: Tuple) -> None:
+    if _captured is not None:
+        _captured.append(item)
+    elif _writer is None:     # Not opened yet (or already closed): write synchronously
+        _Write(item)
+    else:
+        _queue.put(item)
+
+
+def _Write(item: Tuple) -> None:
+    _inWrite.active=True
+    try:
+        if item[0] == "header":
+            _LogPackageSetHeader(item[1])
+        else:
+            _LogPackageLog(item[1], isError=item[2], noNewLine=item[3])
+    finally:
+        _inWrite.active=False
+
+
+# The background thread which does the actual writing
+def _WriteLog() -> None:
+    while True:
+        item=_queue.get()
+        try:
+            if item is None:
+                return
+            _Write(item)
+        finally:
+            _queue.task_done()
+
+
+# Other packages (F3Page, HelpersPackage, ...) call the Log package directly.  If they wrote to the log files themselves, they would race with the writer thread
+# and fight over the header, and in a worker process their messages would bypass the capture.  So the Log package's Log() and LogSetHeader() are replaced
+# by versions which go through the queue like everything else.  This is done when this module is imported, rather than in LogOpen(), so that it's in place
+# before any module which does "from Log import Log" is imported: import AsyncLog before them.
+def _RoutedLog(text: str, isError: bool=False, noNewLine: bool=False) -> None:
+    if getattr(_inWrite, "active", False):
+        _LogPackageLog(text, isError=isError, noNewLine=noNewLine)
+        return
+    _Enqueue(ERROR if isError else INFO, (text,), isError, noNewLine)
+
+
+def _RoutedSetHeader(text: str) -> None:
+    if getattr(_inWrite, "active", False):
+        _LogPackageSetHeader(text)
+        return
+    LogSetHeader(text)
+
+
+_Log.Log=_RoutedLog
+_Log.LogSetHeader=_RoutedSetHeader
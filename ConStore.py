@@ -0,0 +1,107 @@
+from __future__ import annotations
+from typing import List, Tuple
+
+import calendar
+from datetime import date
+
+import numpy as np
+
+from FanzineIssueSpecPackage import FanzineDate
+from ConInfo import ConInfo
+
+# A columnar representation of the list of conventions.
+# Each con's dates and flags are kept in parallel NumPy arrays so that sorting, grouping by year and checks
+# can be done on whole columns at once rather than by walking the ConInfo objects (and comparing FanzineDateRanges) one at a time.
+# The ConInfo objects are kept, in the same order, for rendering.
+
+# Bits in the Flags column
+VIRTUAL=1
+CANCELLED=2
+ODD=4
+
+
+# Convert a FanzineDate to a day number (as in date.toordinal()).  Missing months and days are taken as the first.  An empty date is 0.
+def DateOrdinal(fd: FanzineDate) -> int:
+    if fd is None or fd.Year is None or fd.Year <= 0:
+        return 0
+    month=fd.Month if fd.Month is not None and 1 <= fd.Month <= 12 else 1
+    day=fd.Day if fd.Day is not None and fd.Day >= 1 else 1
+    day=min(day, calendar.monthrange(fd.Year, month)[1])
+    return date(fd.Year, month, day).toordinal()
+
+
+#------------------------------------
+class ConStore:
+    def __init__(self, conventions: List[ConInfo]):
+        self.Cons: List[ConInfo]=list(conventions)
+        n=len(self.Cons)
+
+        self.Start=np.zeros(n, dtype=np.int32)
+        self.End=np.zeros(n, dtype=np.int32)
+        self.Year=np.zeros(n, dtype=np.int32)
+        self.Flags=np.zeros(n, dtype=np.uint8)
+
+        for i, con in enumerate(self.Cons):
+            dr=con.DateRange
+            start=DateOrdinal(dr._startdate)
+            end=DateOrdinal(dr._enddate)
+            self.Start[i]=start
+            self.End[i]=end if end >= start else start     # A single date has no end date
+            self.Year[i]=dr._startdate.Year if dr._startdate is not None and dr._startdate.Year is not None else 0
+            flags=0
+            if con.Virtual:
+                flags|=VIRTUAL
+            if con.Cancelled:
+                flags|=CANCELLED
+            if dr.IsOdd():
+                flags|=ODD
+            self.Flags[i]=flags
+
+    def __len__(self) -> int:
+        return len(self.Cons)
+
+    # Put everything into date order: by start date and then end date.  The sort is stable, so cons with the same dates keep their original order.
+    # Because missing months and days are taken as the first, different dates (e.g., "1975", "Jan 1975" and "Jan 1 1975") can have the same day numbers.
+    # Each run of equal day numbers is put in the order the FanzineDateRange comparison gives it, so the result is the same as sorting by DateRange
+    # as long as that comparison puts a partial date before the later dates it doesn't cover.  (CheckDateOrder() checks this.)
+    def SortByDate(self) -> None:
+        order=np.lexsort((self.End, self.Start))
+        if len(order) > 1:
+            start=self.Start[order]
+            end=self.End[order]
+            bounds=np.flatnonzero((start[1:] != start[:-1]) | (end[1:] != end[:-1]))+1
+            runStarts=np.concatenate(([0], bounds))
+            runEnds=np.concatenate((bounds, [len(order)]))
+            for s in np.flatnonzero(runEnds-runStarts > 1):
+                run=order[runStarts[s]:runEnds[s]]
+                order[runStarts[s]:runEnds[s]]=sorted(run, key=lambda i: self.Cons[i].DateRange)
+        self.Cons=[self.Cons[i] for i in order]
+        for col in ["Start", "End", "Year", "Flags"]:
+            setattr(self, col, getattr(self, col)[order])
+
+    # Check the order against sorting the cons by DateRange, as was done before there was a store
+    # Return the positions at which the two orders differ
+    def CheckDateOrder(self) -> List[int]:
+        expected=sorted(self.Cons, key=lambda con: con.DateRange)
+        return [i for i, (con, exp) in enumerate(zip(self.Cons, expected)) if con is not exp]
+
+    # The indexes of the cons which have all of the specified flag bits set
+    def WithFlags(self, flags: int) -> np.ndarray:
+        return np.flatnonzero((self.Flags & flags) == flags)
+
+    def Oddities(self) -> np.ndarray:
+        return self.WithFlags(ODD)
+
+    # The indexes of the cons which run longer than maxDays.  (Duration is counted the same way as FanzineDateRange.Duration(): end-start.)
+    def LongDurations(self, maxDays: int=6) -> np.ndarray:
+        return np.flatnonzero((self.Start > 0) & (self.End-self.Start > maxDays))
+
+    # Split the (sorted) cons into runs with the same starting year
+    # Return a list of (year, indexes) tuples in order
+    def YearGroups(self) -> List[Tuple[int, np.ndarray]]:
+        if len(self) == 0:
+            return []
+        bounds=np.flatnonzero(np.diff(self.Year))+1
+        starts=np.concatenate(([0], bounds))
+        ends=np.concatenate((bounds, [len(self)]))
+        return [(int(self.Year[s]), np.arange(s, e)) for s, e in zip(starts, ends)]
@@ -0,0 +1,416 @@
+from __future__ import annotations
+from typing import Optional, Tuple, List, Union
+from dataclasses import dataclass
+
+import re
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+import AsyncLog     # First, so that other packages' logging is routed through it
+from AsyncLog import Log, LogDebug, LogSetHeader, LogClearHeader, LogStartCapture, LogEndCapture, LogReplay, SetLogLevel
+from F3Page import F3Page
+from HelpersPackage import WikiExtractLink, CrosscheckListElement
+from FanzineIssueSpecPackage import FanzineDateRange
+from ConInfo import ConInfo
+from RowProfile import RowProfile
+
+# Extraction of the conventions listed in the tables of Conseries pages.
+# Each page is processed independently of all the others, so the pages can be farmed out to a pool of processes.
+
+# Scan for a virtual flag
+# Return True/False and remaining text after V-flag is removed
+def ScanForVirtual(input: str) -> Tuple[bool, str]:
+    # First look for the alternative contained in parens *anywhere* in the text
+    pat = "\((:?virtual|online|held online|moved online|virtual convention)\)"
+    newval = re.sub(pat, "", input,
+                    flags=re.IGNORECASE)  # Check w/parens 1st so that if parens exist, they get removed.
+    if input != newval:
+        return True, newval.strip()
+    # Now look for alternatives by themselves.  So we don't pick up junk, we require that the non-parenthesized alternatives be alone in the cell
+    newval = re.sub("\s*" + pat + "\s*$", "", input, flags=re.IGNORECASE)
+    if input != newval:
+        return True, newval.strip()
+    return False, input
+
+# Scan for text bracketed by <s>...</s>
+# Return True/False and remaining text after <s> </s> is removed
+def ScanForS(input: str) -> Tuple[bool, str]:
+    m=re.match("\w*<s>(.*)</s>\w*$", input)
+    if m is None:
+        return False, input
+    return True, m.groups()[0]
+
+# Convention names as found in a Conseries table
+@dataclass
+class ConName:
+    #def __init__(self, Name: str="", Link: str="", Cancelled: bool=False):
+    Name: str=""
+    Cancelled: bool=False
+    Link: str=""
+
+    def __lt__(self, val: ConName) -> bool:
+        return self.Name < val.Name
+
+def SplitConText(constr: str) -> Tuple[str, str]:
+    # Now convert all link|text to separate link and text
+    # Do this for s1 and s2
+    m=re.match("@@(.+)\|(.+)%%$", constr)       # Split xxx|yyy into xxx and yyy
+    if m is not None:
+        return m.groups()[0], m.groups()[1]
+    m = re.match("@@(.+)%%$", constr)  # Split xxx|yyy into xxx and yyy
+    if m is not None:
+        return "", m.groups()[0]
+    return "", constr
+
+# We assume that the cancelled con names lead the uncancelled ones
+def NibbleCon(constr: str) -> Tuple[Optional[ConName], str]:
+    constr=constr.strip()
+    if len(constr) == 0:
+        return None, constr
+
+    # We want to take the leading con name
+    # There can be at most one con name which isn't cancelled, and it should be at the end, so first look for a <s>...</s> bracketed con names, if any
+    pat="^<s>(.*?)</s>"
+    m=re.match(pat, constr)
+    if m is not None:
+        s=m.groups()[0]
+        constr=re.sub(pat, "", constr).strip()  # Remove the matched part and trim whitespace
+        l, t=SplitConText(s)
+        con=ConName(Name=t, Link=l, Cancelled=True)
+        return con, constr
+
+    # OK, there are no <s>...</s> con names left.  So what is left might be [[name]] or [[link|name]]
+    pat="^(@@(:?.*?)%%)"
+    m=re.match(pat, constr)
+    if m is not None:
+        s=m.groups()[0]
+        constr=re.sub(pat, "", constr).strip()  # Remove the matched part and trim whitespace
+        l, t=SplitConText(s)
+        con=ConName(Name=t, Link=l, Cancelled=False)
+        return con, constr
+
+#TODO:  What's left may be a bare con name or it may be a keyword like "held online" or "virtual".  Need to check this on real data
+    if len(constr) > 0:
+        if constr[0] == ":":
+            return None, ""
+        if ":" in constr:
+            constr=constr.split(":")[0]
+        con=ConName(Name=constr)
+        return con, ""
+
+
+# The '/' in con names is a separator between alternate names of a single con except when it's part of a </xxx> or a fraction.
+def replacer(matchObject) -> str:   # This generates the replacement text when used in a re.sub() call
+    if matchObject.group(1) is not None and matchObject.group(2) is not None:
+        return matchObject.group(1)+"&&&"+matchObject.group(2)
+
+# The shape(s) of a row's decoded con names and dates, for profiling
+def RowShapes(cons: List[Union[ConName, List[ConName]]], dates: List[FanzineDateRange], virtual: bool) -> List[str]:
+    if type(cons[0]) is list:
+        shapes=["Alternates"]
+        names=cons[0]
+    else:
+        names=cons
+        if len(cons) == len(dates):
+            shapes=["1:1" if len(cons) == 1 else "N:N"]
+        elif len(cons) > 1 and len(dates) == 1:
+            shapes=["N:1"]
+        elif len(cons) == 1 and len(dates) > 1:
+            shapes=["1:N"]
+        else:
+            shapes=["Can't happen"]
+    if any(co.Cancelled for co in names) or any(dt.Cancelled for dt in dates):
+        shapes.append("<s>")
+    if virtual:
+        shapes.append("Virtual")
+    return shapes
+
+# Extract the conventions listed in a Conseries page's tables.
+# We return the candidate convention rows in the order they appear in the page.  No attempt is made to remove duplicates or to normalize locations:
+# that requires all the con series pages and the locale database, and is done when the candidates are merged into the global list of conventions by AppendCon().
+# If profile is given, the shape and decode time of each row are recorded in it.
+def ExtractConventionsFromConseriesPage(page: F3Page, profile: Optional[RowProfile]=None) -> List[ConInfo]:
+    candidates: List[ConInfo]=[]
+    LogSetHeader("Processing ", page.Name)
+    # We'd like to find the columns containing:
+    locColumn=None     # The convention's location
+    conColumn=None     # The convention's name
+    dateColumn=None    # The conventions dates
+    for index, table in enumerate(page.Tables):
+        numcolumns=len(table.Headers)
+
+        listLocationHeaders=["Location"]
+        locColumn=CrosscheckListElement(listLocationHeaders, table.Headers)
+        # We don't log a missing location column because that is common and not an error -- we'll try to get the location later from the con instance's page
+
+        listNameHeaders=["Convention", "Convention Name", "Name"]
+        conColumn=CrosscheckListElement(listNameHeaders, table.Headers)
+        if conColumn is None:
+            Log("***Can't find Convention column in table "+str(index+1)+" of "+str(len(page.Tables)), isError=True)
+
+        listDateHeaders=["Date", "Dates"]
+        dateColumn=CrosscheckListElement(listDateHeaders, table.Headers)
+        if conColumn is None:
+            Log("***Can't find Dates column in table "+str(index+1)+" of "+str(len(page.Tables)), isError=True)
+
+        # If we don't have a convention column and a date column we skip the whole table.
+        if conColumn is not None and dateColumn is not None:
+
+            # Walk the convention table, extracting the individual conventions
+            # (Sometimes there will be multiple table
+            if table.Rows is None:
+                Log("***Table "+str(index+1)+" of "+str(len(page.Tables))+"has no rows", isError=True)
+                continue
+
+            for row in table.Rows:
+                if profile is not None:
+                    profile.StartRow(page.Name)
+                LogSetHeader("Processing: ", page.Name, "  row: ", row)     # The header is formatted later, so give it the original, unedited row
+                row=list(row)   # We edit the row as we go, so work on a copy and leave the page as it was
+                # Skip rows with merged columns, and rows where either the date or convention cell is empty
+                if len(row) < numcolumns-1 or len(row[conColumn]) == 0  or len(row[dateColumn]) == 0:
+                    if profile is not None:
+                        profile.Classify("Skipped")
+                    continue
+
+                # If the con series table has a location column, extract the location
+                conlocation=""
+                if locColumn is not None:
+                    if locColumn < len(row) and len(row[locColumn]) > 0:
+                        conlocation=WikiExtractLink(row[locColumn])
+
+                # Check the row for (virtual) in any form. If found, set the virtual flag and remove the text from the line
+                virtual=False
+                for idx, col in enumerate(row):
+                    v2, col=ScanForVirtual(col)
+                    if v2:
+                        row[idx]=col      # Update row with the virtual flag removed
+                    virtual=virtual or v2
+                LogDebug("Virtual=", virtual)
+
+                # Decode the convention and date columns add the resulting convention(s) to the list
+                # This is really complicated since there are (too) many cases and many flavors to the cases.  The cases:
+                #   name1 || date1          (1 con: normal)
+                #   <s>name1</s> || <s>date1</s>        (1: cancelled)
+                #   <s>name1</s> || date1        (1: cancelled)
+                #   name1 || <s>date1</s>        (1: cancelled)
+                #   <s>name1</s> name2 || <s>date1</s> date2        (2: cancelled and then re-scheduled)
+                #   name1 || <s>date1</s> date2             (2: cancelled and rescheduled)
+                #   <s>name1</s> || <s>date1</s> date2            (2: cancelled and rescheduled)
+                #   <s>name1</s> || <s>date1</s> <s>date2</s>            (2: cancelled and rescheduled and cancelled)
+                #   <s>name1</s> name2 || <s>date1</s> date2            (2: cancelled and rescheduled under new name)
+                #   <s>name1</s> <s>name2</s> || <s>date1</s> <s>date2</s>            (2: cancelled and rescheduled under new name and then cancelled)
+                # and all of these cases may have the virtual flag, but it is never applied to a cancelled con unless that is the only option
+                # Basically, the pattern is 1 || 1, 1 || 2, 2 || 1, or 2 || 2 (where # is the number of items)
+                # 1:1 and 2:2 match are yield two cons
+                # 1:2 yields two cons if 1 date is <s>ed
+                # 2:1 yields two cons if 1 con is <s>ed
+                # The strategy is to sort out each column separately and then try to merge them into conventions
+                # Note that we are disallowing the extreme case of three cons in one row!
+
+                # First the dates
+                datetext = row[dateColumn]
+
+                # For the dates column, we want to remove the virtual designation as it will just confuse later processing.
+                # We want to handle the case where (virtual) is in parens, but also when it isn't.
+                # We need two patterns here because Python's regex doesn't have balancing groups and we don't want to match unbalanced parens
+
+                # Ignore anything in trailing parenthesis. (e.g, "(Easter weekend)", "(Memorial Day)")
+                p=re.compile("\(.*\)\s?$")  # Note that this is greedy. Is that the correct things to do?
+                datetext=re.sub("\(.*\)\s?$", "", datetext)
+                # Convert the HTML characters some people have inserted into their ascii equivalents
+                datetext=datetext.replace("&nbsp;", " ").replace("&#8209;", "-")
+                # Remove leading and trailing spaces
+                datetext=datetext.strip()
+
+                # Now look for dates. There are many cases to consider:
+                #1: date                    A simple date (note that there will never be two simple dates in a dates cell)
+                #2: <s>date</s>             A canceled con's date
+                #3: <s>date</s> date        A rescheduled con's date
+                #4: <s>date</s> <s>date</s> A rescheduled and then cancelled con's dates
+                #5: <s>date</s> <s>date</s> date    A twice-rescheduled con's dates
+                #m=re.match("^(:?(<s>.+?</s>)\s*)*(.*)$", datetext)
+                pat="<s>.+?</s>"
+                ds=re.findall(pat, datetext)
+                if len(ds) > 0:
+                    datetext=re.sub(pat, "", datetext).strip()
+                if len(datetext)> 0:
+                    ds.append(datetext)
+                if len(ds) is None:
+                    LogDebug("Date error: ", datetext)
+                    continue
+
+                # We have N groups up to N-1 of which might be None
+                dates:List[FanzineDateRange]=[]
+                for d in ds:
+                    if d is not None and len(d) > 0:
+                        c, s=ScanForS(d)
+                        dr=FanzineDateRange().Match(s)
+                        dr.Cancelled=c
+                        if not dr.IsEmpty():
+                            dates.append(dr)
+
+                if len(dates) == 0:
+                    Log("***No dates found", isError=True)
+                elif len(dates) == 1:
+                    LogDebug("1 date: ", dates[0])
+                else:
+                    LogDebug(len(dates), " dates: ", dates[0])
+                    for d in dates[1:]:
+                        LogDebug("           ", d)
+
+
+                # Get the corresponding convention name(s).
+                context=row[conColumn]
+                # Clean up the text
+                context=context.replace("[[", "@@").replace("]]", "%%")  # The square brackets are Regex special characters. This substitution makes the patterns simpler to read
+                # Convert the HTML characters some people have inserted into their ascii equivalents
+                context=context.replace("&nbsp;", " ").replace("&#8209;", "-")
+                # And get rid of hard line breaks
+                context=context.replace("<br>", " ")
+                # In some pages we italicize or bold the con's name, so remove spans of single quotes 2 or longer
+                context=re.sub("[']{2,}", "", context)
+
+                context=context.strip()
+
+                if context.count("@@") != context.count("%%"):
+                    Log("'"+row[conColumn]+"' has unbalanced double brackets. This is unlikely to end well...", isError=True)
+
+                # An individual name is of one of these forms:
+                    #   xxx
+                    # [[xxx]] zzz               Ignore the "zzz"
+                    # [[xxx|yyy]]               Use just xxx
+                    # [[xxx|yyy]] zzz
+                # But! There can be more than one name on a date if a con converted from real to virtual while changing its name and keeping its dates:
+                # E.g., <s>[[FilKONtario 30]]</s> [[FilKONtari-NO]] (trailing stuff)
+                # Whatcon 20: This Year's Theme -- need to split on the colon
+                # Each of the bracketed chunks can be of one of the four forms, above. (Ugh.)
+                # But! con names can also be of the form name1 / name2 / name 3
+                #   These are three (or two) different names for the same con.
+                # We will assume that there is only limited mixing of these forms!
+
+                cons: List[Union[ConName, List[ConName]]]=[]
+                # Do we have "/" in the con name that is not part of a </s> and not part of a fraction? If so, we have alternate names, not separate cons
+                # The strategy here is to recognize the '/' which are *not* con name separators and turn them into '&&&', then split on the remaining '/' and restore the real ones
+                context=re.sub("(<)/([A-Za-z])", replacer, context)  # Hide the '/' in things like </xxx>
+                context=re.sub("([0-9])/([0-9])", replacer, context)    # Hide the '/' in fractions
+                contextlist=re.split("/", context)
+                contextlist=[x.replace("&&&", "/").strip() for x in contextlist]    # Restore the real '/'s
+                context=context.replace("&&&", "/").strip()
+                if len(contextlist) > 1:
+                    contextlist=[x.strip() for x in contextlist if len(x.strip()) > 0]
+                    alts: List[ConName]=[]
+                    for con in contextlist:
+                        c, _=NibbleCon(con)
+                        if c is not None:
+                            alts.append(c)
+                    alts.sort()     # Sort the list so that when this list is created from two or more different convention idnex tables, it looks the same and dups can be removed.
+                    cons.append(alts)
+                else:
+                    # Ok, we have one or more names and they are for different cons
+                    while len(context) > 0:
+                        con, context=NibbleCon(context)
+                        if con is None:
+                            break
+                        cons.append(con)
+
+                # Now we have cons and dates and need to create the appropriate convention entries.
+                if len(cons) == 0 or len(dates) == 0:
+                    Log("Scan abandoned: ncons="+str(len(cons))+"  len(dates)="+str(len(dates)), isError=True)
+                    if profile is not None:
+                        profile.Classify("Scan abandoned")
+                    continue
+                if profile is not None:
+                    profile.Classify(*RowShapes(cons, dates, virtual))
+
+                # The first case we need to look at it whether cons[0] has a type of list of ConInfo
+                # This is one con with multiple names
+                if type(cons[0]) is list:
+                    # By definition there is only one element. Extract it.  There may be more than one date.
+                    assert len(cons) == 1 and len(cons[0]) > 0
+                    cons=cons[0]
+                    for dt in dates:
+                        override=""
+                        cancelled=dt.Cancelled
+                        dt.Cancelled = False
+                        for co in cons:
+                            cancelled=cancelled or co.Cancelled
+                            if len(override) > 0:
+                                override+=" / "
+                            override+="[["
+                            if len(co.Link) > 0:
+                                override+=co.Link+"|"
+                            override+=co.Name+"]]"
+                        v = False if cancelled else virtual
+                        ci=ConInfo(_Link="dummy", NameInSeriesList="dummy", Loc=conlocation, DateRange=dt, Virtual=v, Cancelled=cancelled)
+                        ci.Override=override
+                        candidates.append(ci)
+                        LogDebug("#append 1: ", ci)
+                # OK, in all the other cases cons is a list[ConInfo]
+                elif len(cons) == len(dates):
+                    # Add each con with the corresponding date
+                    for i in range(len(cons)):
+                        cancelled=cons[i].Cancelled or dates[i].Cancelled
+                        dates[i].Cancelled=False    # We've xferd this to ConInfo and don't still want it here because it would print twice
+                        v=False if cancelled else virtual
+                        ci=ConInfo(_Link=cons[i].Link, NameInSeriesList=cons[i].Name, Loc=conlocation, DateRange=dates[i], Virtual=v, Cancelled=cancelled)
+                        if ci.DateRange.IsEmpty():
+                            Log("***"+ci.Link+"has an empty date range: "+str(ci.DateRange), isError=True)
+                        LogDebug("#append 2: ", ci)
+                        candidates.append(ci)
+                elif len(cons) > 1 and len(dates) == 1:
+                    # Multiple cons all with the same dates
+                    for co in cons:
+                        cancelled=co.Cancelled or dates[0].Cancelled
+                        dates[0].Cancelled = False
+                        v=False if cancelled else virtual
+                        ci=ConInfo(_Link=co.Link, NameInSeriesList=co.Name, Loc=conlocation, DateRange=dates[0], Virtual=v, Cancelled=cancelled)
+                        candidates.append(ci)
+                        LogDebug("#append 3: ", ci)
+                elif len(cons) == 1 and len(dates) > 1:
+                    for dt in dates:
+                        cancelled=cons[0].Cancelled or dt.Cancelled
+                        dt.Cancelled = False
+                        v=False if cancelled else virtual
+                        ci=ConInfo(_Link=cons[0].Link, NameInSeriesList=cons[0].Name, Loc=conlocation, DateRange=dt, Virtual=v, Cancelled=cancelled)
+                        candidates.append(ci)
+                        LogDebug("#append 4: ", ci)
+                else:
+                    Log("Can't happen! ncons="+str(len(cons))+"  len(dates)="+str(len(dates)), isError=True)
+
+            if profile is not None:
+                profile.EndRow()
+
+    LogClearHeader()    # The last row's header is only wanted if something was logged for it
+    return candidates
+
+
+# Extract the candidate cons from a page, returning them along with the log messages which were generated while doing so
+# (and the page's row profile, if profiling).  This is what runs in the worker processes.
+def ExtractConventionsFromConseriesPageWithLog(page: F3Page, profiling: bool) -> Tuple[List[ConInfo], List[Tuple], Optional[RowProfile]]:
+    profile=RowProfile() if profiling else None
+    LogStartCapture()
+    try:
+        candidates=ExtractConventionsFromConseriesPage(page, profile)
+    finally:
+        captured=LogEndCapture()
+    return candidates, captured, profile
+
+
+# Extract the candidate cons from a list of Conseries pages using a pool of jobs processes.
+# Return a list with the candidates for each page in the same order as the pages.  The log messages are also written in page order,
+# so the results and the log are the same as if the pages had been processed serially.
+# If profile is given, the row profiles of all the pages are merged into it.
+def ExtractConventionsFromConseriesPages(pages: List[F3Page], jobs: int, profile: Optional[RowProfile]=None) -> List[List[ConInfo]]:
+    if jobs <= 1 or len(pages) < 2:
+        return [ExtractConventionsFromConseriesPage(page, profile) for page in pages]
+
+    results: List[List[ConInfo]]=[]
+    chunksize=max(1, len(pages)//(4*jobs))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=SetLogLevel, initargs=(AsyncLog.logLevel,)) as executor:
+        for candidates, captured, pageProfile in executor.map(ExtractConventionsFromConseriesPageWithLog, pages, repeat(profile is not None), chunksize=chunksize):
+            LogReplay(captured)
+            results.append(candidates)
+            if profile is not None:
+                profile.Merge(pageProfile)
+    return results
@@ -0,0 +1,130 @@
+from __future__ import annotations
+from typing import Optional, Dict, List, Any
+
+import os
+import re
+import json
+
+from AsyncLog import Log
+
+# Support for delta output.
+# Reports are written through a ReportWriter, which only touches the file on disk when its contents have really changed,
+# and the structured results of each run are saved so that the next run can list what was added, removed or changed since then.
+
+#------------------------------------
+# A file-like object which accumulates a report in memory and, when closed, writes it out only if it differs from what is already on disk.
+# ignore is an optional regex matching volatile text (e.g., a generation timestamp) which is to be disregarded when comparing.
+class ReportWriter:
+    def __init__(self, fname: str, onlyIfChanged: bool=True, ignore: Optional[str]=None):
+        self.Fname=fname
+        self.OnlyIfChanged=onlyIfChanged
+        self.Ignore=ignore
+        self.Rewritten=False
+        self._chunks: List[str]=[]
+        self._closed=False
+
+    def __enter__(self) -> ReportWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:    # Don't replace a good report with a partial one
+            self.close()
+
+    def write(self, s: str) -> int:
+        self._chunks.append(s)
+        return len(s)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed=True
+        text="".join(self._chunks)
+        if self.OnlyIfChanged and os.path.isfile(self.Fname):
+            with open(self.Fname, "r", encoding='utf-8') as f:
+                old=f.read()
+            if self._Comparable(old) == self._Comparable(text):
+                Log("   "+self.Fname+" is unchanged")
+                return
+        with open(self.Fname, "w+", encoding='utf-8') as f:
+            f.write(text)
+        self.Rewritten=True
+
+    def _Comparable(self, s: str) -> str:
+        if self.Ignore is None:
+            return s
+        return re.sub(self.Ignore, "", s)
+
+
+#------------------------------------
+# The structured results of a run are a dictionary keyed by report name.
+# Each report is itself a dictionary whose keys identify an entry and whose values are what we know about that entry.
+# Values must be JSON-serializable.  List values are compared as sets of items.
+def LoadRunState(fname: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    if not os.path.isfile(fname):
+        return None
+    try:
+        with open(fname, "r", encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        Log("LoadRunState: could not read '"+fname+"': "+str(e), isError=True)
+        return None
+
+
+def SaveRunState(fname: str, state: Dict[str, Dict[str, Any]]) -> None:
+    with open(fname, "w+", encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+# Write a list of what has changed in each report between the previous run and this one.
+# The format is
+#     **<report name>
+#       + <added entry>
+#       - <removed entry>
+#       ~ <changed entry>: <what changed>
+def WriteDeltaReport(f, old: Optional[Dict[str, Dict[str, Any]]], new: Dict[str, Dict[str, Any]]) -> None:
+    if old is None:
+        f.write("No results were saved by a previous run, so there is nothing to compare with.\n")
+        return
+
+    for report, newEntries in new.items():
+        oldEntries=old.get(report, {})
+        added=[k for k in newEntries.keys() if k not in oldEntries]
+        removed=[k for k in oldEntries.keys() if k not in newEntries]
+        changed=[k for k in newEntries.keys() if k in oldEntries and not SameValue(oldEntries[k], newEntries[k])]
+
+        f.write("**"+report+"  ("+str(len(added))+" added, "+str(len(removed))+" removed, "+str(len(changed))+" changed)\n")
+        for k in sorted(added):
+            f.write("  + "+k+DescribeValue(newEntries[k])+"\n")
+        for k in sorted(removed):
+            f.write("  - "+k+DescribeValue(oldEntries[k])+"\n")
+        for k in sorted(changed):
+            f.write("  ~ "+k+": "+DescribeChange(oldEntries[k], newEntries[k])+"\n")
+
+
+def SameValue(v1: Any, v2: Any) -> bool:
+    if type(v1) is list and type(v2) is list:
+        return set(v1) == set(v2)
+    return v1 == v2
+
+
+def DescribeValue(v: Any) -> str:
+    if v is None or v == "" or v == [] or v == {}:
+        return ""
+    if type(v) is list:
+        return "  ["+", ".join(str(x) for x in v)+"]"
+    if type(v) is dict:
+        return "  ("+", ".join(k+"="+str(x) for k, x in v.items())+")"
+    return " --> "+str(v)
+
+
+def DescribeChange(v1: Any, v2: Any) -> str:
+    if type(v1) is list and type(v2) is list:
+        s1=set(v1)
+        s2=set(v2)
+        out=["+"+x for x in v2 if x not in s1]
+        out.extend(["-"+x for x in v1 if x not in s2])
+        return ", ".join(out)
+    if type(v1) is dict and type(v2) is dict:
+        keys=list(v1.keys())+[k for k in v2.keys() if k not in v1]
+        return ", ".join(k+": "+str(v1.get(k))+" --> "+str(v2.get(k)) for k in keys if v1.get(k) != v2.get(k))
+    return str(v1)+" --> "+str(v2)
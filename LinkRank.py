@@ -0,0 +1,80 @@
+from __future__ import annotations
+from typing import Dict, List
+
+import numpy as np
+
+from F3Page import F3Page
+from AsyncLog import Log
+
+# Score the importance of each page from the link graph so that lists of pages (e.g., the pages which refer to a person) can be put in order of importance.
+# This is PageRank: a page is important if important pages link to it.  Links are weighted by the kind of page they point to,
+# and the random jumps favor the same kinds, so fanzines and conventions count for more than miscellaneous pages.
+# Each iteration is a sparse matrix-vector product done with np.bincount over the edge arrays, so it's fast even on the full graph.
+
+# The weight of each kind of page.  A page which is of more than one kind gets the largest.
+kindWeights: Dict[str, float]={
+    "Person": 3.0,
+    "Fanzine": 2.0,
+    "Convention": 1.5,
+    "Conseries": 1.5,
+}
+
+
+def PageKindWeight(page: F3Page) -> float:
+    weight=1.0
+    if page.IsPerson:
+        weight=max(weight, kindWeights["Person"])
+    for tag in ["Fanzine", "Convention", "Conseries"]:
+        if tag in page.Tags:
+            weight=max(weight, kindWeights[tag])
+    return weight
+
+
+# Return a dictionary of the importance of each page, keyed by page name.  The scores sum to 1.
+def RankPages(pages: Dict[str, F3Page], damping: float=0.85, tolerance: float=1.0e-9, maxIterations: int=100) -> Dict[str, float]:
+    names=list(pages.keys())
+    n=len(names)
+    if n == 0:
+        return {}
+    ids={name: i for i, name in enumerate(names)}
+
+    # Build the edge list.  Links to missing pages and links from a page to itself are ignored.
+    src: List[int]=[]
+    dst: List[int]=[]
+    for name, page in pages.items():
+        i=ids[name]
+        for ref in page.OutgoingReferences:
+            j=ids.get(ref.LinkWikiName)
+            if j is not None and j != i:
+                src.append(i)
+                dst.append(j)
+    srcs=np.array(src, dtype=np.int64)
+    dsts=np.array(dst, dtype=np.int64)
+
+    kind=np.array([PageKindWeight(pages[name]) for name in names], dtype=np.float64)
+    teleport=kind/kind.sum()
+
+    # Each page splits its score among its links in proportion to the weight of the page linked to
+    edgeWeight=kind[dsts]
+    outWeight=np.bincount(srcs, weights=edgeWeight, minlength=n)
+    edgeShare=edgeWeight/outWeight[srcs]
+    dangling=outWeight == 0     # Pages with no links spread their score like a random jump
+
+    rank=teleport.copy()
+    for iteration in range(maxIterations):
+        flow=np.bincount(dsts, weights=rank[srcs]*edgeShare, minlength=n)
+        new=damping*(flow+rank[dangling].sum()*teleport)+(1.0-damping)*teleport
+        delta=np.abs(new-rank).sum()
+        rank=new
+        if delta < tolerance:
+            Log("   Page ranks converged after "+str(iteration+1)+" iterations ("+str(n)+" pages, "+str(len(srcs))+" links)")
+            break
+    else:
+        Log("   Page ranks did not converge after "+str(maxIterations)+" iterations (last change="+str(delta)+")", isError=True)
+
+    return {name: float(rank[i]) for i, name in enumerate(names)}
+
+
+# Sort a list of page names by importance, most important first.  Pages with equal scores keep their order.
+def SortByRank(pagenames: List[str], ranks: Dict[str, float]) -> List[str]:
+    return sorted(pagenames, key=lambda name: -ranks.get(name, 0.0))
@@ -0,0 +1,97 @@
+from __future__ import annotations
+from typing import Optional, Dict, List, TextIO
+from dataclasses import dataclass, field
+
+import time
+
+# Opt-in profiling of the Conseries table decoder.
+# Every row which is decoded is classified by its shape: how many con names and dates it has (1:1, 1:N, N:1, N:N), whether the names are '/'-separated
+# alternates, and whether it has <s>-cancellations or a virtual marker -- or whether it was skipped or failed ("Scan abandoned", "Can't happen").
+# The row count, the cumulative decode time and the failures are totalled for each shape and for each Conseries page.
+# A profile is built in each worker process and the profiles are merged, so the totals are the same however many processes are used.
+
+# Shapes which mean that the row could not be decoded
+failureShapes={"Scan abandoned", "Can't happen"}
+
+
+@dataclass
+class RowStats:
+    Rows: int=0
+    Time: float=0.0
+    Failures: int=0
+
+    def Add(self, secs: float, failed: bool) -> None:
+        self.Rows+=1
+        self.Time+=secs
+        if failed:
+            self.Failures+=1
+
+    def Merge(self, other: RowStats) -> None:
+        self.Rows+=other.Rows
+        self.Time+=other.Time
+        self.Failures+=other.Failures
+
+
+#------------------------------------
+@dataclass
+class RowProfile:
+    ByShape: Dict[str, RowStats]=field(default_factory=dict)
+    ByPage: Dict[str, RowStats]=field(default_factory=dict)
+    # The row currently being decoded
+    _page: Optional[str]=None
+    _shapes: List[str]=field(default_factory=list)
+    _start: float=0.0
+
+    # Start timing a row.  (Any row still being timed is finished first.)
+    def StartRow(self, pagename: str) -> None:
+        self.EndRow()
+        self._page=pagename
+        self._shapes=[]
+        self._start=time.perf_counter()
+
+    # Give the shape(s) of the row being timed.  A row can have more than one, e.g., N:N with <s>-cancellations.
+    def Classify(self, *shapes: str) -> None:
+        self._shapes=list(shapes)
+
+    def EndRow(self) -> None:
+        if self._page is None:
+            return
+        secs=time.perf_counter()-self._start
+        failed=any(shape in failureShapes for shape in self._shapes)
+        for shape in self._shapes or ["Unclassified"]:
+            self.ByShape.setdefault(shape, RowStats()).Add(secs, failed)
+        self.ByPage.setdefault(self._page, RowStats()).Add(secs, failed)
+        self._page=None
+
+    def Merge(self, other: RowProfile) -> None:
+        other.EndRow()
+        for shape, stats in other.ByShape.items():
+            self.ByShape.setdefault(shape, RowStats()).Merge(stats)
+        for pagename, stats in other.ByPage.items():
+            self.ByPage.setdefault(pagename, RowStats()).Merge(stats)
+
+    # Write the profile as a set of tables: all the shapes, then the slowest and the most-failing pages
+    def Write(self, f: TextIO, topN: int=25) -> None:
+        self.EndRow()
+        rows=sum(stats.Rows for stats in self.ByPage.values())
+        secs=sum(stats.Time for stats in self.ByPage.values())
+        f.write("Conseries row profile: "+str(rows)+" rows on "+str(len(self.ByPage))+" pages in "+f"{secs:.3f}"+" sec\n")
+
+        f.write("\nBy row shape (a row can have more than one shape, so these overlap)\n")
+        WriteStatsTable(f, "Shape", sorted(self.ByShape.items(), key=lambda x: -x[1].Time))
+
+        slowest=sorted(self.ByPage.items(), key=lambda x: -x[1].Time)[:topN]
+        f.write("\nThe "+str(len(slowest))+" slowest pages\n")
+        WriteStatsTable(f, "Page", slowest)
+
+        failing=sorted([x for x in self.ByPage.items() if x[1].Failures > 0], key=lambda x: (-x[1].Failures, -x[1].Time))[:topN]
+        f.write("\nThe "+str(len(failing))+" pages with the most failures\n")
+        WriteStatsTable(f, "Page", failing)
+
+
+def WriteStatsTable(f: TextIO, title: str, rows: List) -> None:
+    width=max([len(title)]+[len(name) for name, _ in rows])
+    f.write(f"  {title:<{width}}  {'Rows':>7}  {'Failures':>8}  {'Time (ms)':>10}  {'us/row':>8}\n")
+    for name, stats in rows:
+        perRow=1.0e6*stats.Time/stats.Rows if stats.Rows > 0 else 0.0
+        f.write(f"  {name:<{width}}  {stats.Rows:>7}  {stats.Failures:>8}  {1.0e3*stats.Time:>10.2f}  {perRow:>8.1f}\n")
@@ -0,0 +1,101 @@
+from __future__ import annotations
+from typing import Dict, List, Tuple
+from dataclasses import dataclass, field
+
+import os
+import pickle
+import zlib
+import hashlib
+
+from F3Page import F3Page
+from AsyncLog import Log
+from ConInfo import ConInfo
+
+# Support for running the page digestion and Conseries extraction as N shards, possibly on different machines.
+# Each shard takes a hash partition of the site's pages and writes its partial results to a shard file.
+# A merge run then reads all N shard files and reassembles the global tables in the same order a single-machine run would have built them.
+# This relies on every shard starting from the same list of pages in the same order, so the list is sorted (directory listings may be in
+# a different order on different machines) and each shard records a hash of it, which the merge checks.
+
+#------------------------------------
+# The partial results of one shard
+@dataclass
+class ShardResult:
+    Shard: int=0        # 0-based
+    NumShards: int=1
+    ListingHash: str=""     # ListingHash() of the full list of the site's pages which the shard was taken from
+    # All of the keys below are the position of a page's file in the full list of the site's pages.
+    # This lets the merge put everything back in the order a single-machine run would have processed it.
+    Fnames: Dict[int, str]=field(default_factory=dict)      # The filenames of all the pages in this partition (whether digested or ignored)
+    Pages: Dict[int, F3Page]=field(default_factory=dict)    # The digested pages.  These carry the tags, redirect and outgoing references of each page.
+    ConseriesCons: Dict[int, List[ConInfo]]=field(default_factory=dict)     # The candidate con rows extracted from each Conseries page
+
+
+# Which shard does a page belong to?
+# Python's hash() is salted differently in each process, so we need a hash which is the same on every machine.
+def ShardOf(fname: str, numShards: int) -> int:
+    return zlib.crc32(fname.encode("utf-8")) % numShards
+
+
+# A hash of the full list of pages, so the merge can check that all the shards were taken from the same listing
+def ListingHash(fnames: List[str]) -> str:
+    return hashlib.sha256("\n".join(fnames).encode("utf-8")).hexdigest()
+
+
+def ShardFname(shard: int, numShards: int) -> str:
+    return "Shard "+str(shard+1)+" of "+str(numShards)+".pickle"
+
+
+def WriteShard(result: ShardResult) -> None:
+    fname=ShardFname(result.Shard, result.NumShards)
+    with open(fname, "wb") as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    Log("   Wrote '"+fname+"': "+str(len(result.Pages))+" pages, "+str(len(result.ConseriesCons))+" Conseries pages")
+
+
+# Read all the shard files and merge them.
+# Return the list of all page filenames, the dictionary of pages by wiki name and the candidate con rows for each Conseries page (keyed by page name)
+def ReadShards(numShards: int) -> Tuple[List[str], Dict[str, F3Page], Dict[str, List[ConInfo]]]:
+    fnames: Dict[int, str]={}
+    pages: Dict[int, F3Page]={}
+    conseriesCons: Dict[int, List[ConInfo]]={}
+    listingHash=None
+    for shard in range(numShards):
+        fname=ShardFname(shard, numShards)
+        if not os.path.isfile(fname):
+            Log("ReadShards: can't find '"+fname+"'", isError=True)
+            raise FileNotFoundError(fname)
+        with open(fname, "rb") as f:
+            result: ShardResult=pickle.load(f)
+        if result.NumShards != numShards or result.Shard != shard:
+            Log("ReadShards: '"+fname+"' contains shard "+str(result.Shard+1)+" of "+str(result.NumShards), isError=True)
+            raise ValueError(fname)
+        # If the shards were made from different listings of the site, their page positions don't agree and pages would be silently lost
+        if listingHash is None:
+            listingHash=result.ListingHash
+        elif result.ListingHash != listingHash:
+            Log("ReadShards: '"+fname+"' was made from a different list of the site's pages than '"+ShardFname(0, numShards)+"'", isError=True)
+            raise ValueError(fname)
+        overlap=fnames.keys() & result.Fnames.keys()
+        if len(overlap) > 0:
+            Log("ReadShards: '"+fname+"' has "+str(len(overlap))+" page positions which are also in an earlier shard", isError=True)
+            raise ValueError(fname)
+        fnames.update(result.Fnames)
+        pages.update(result.Pages)
+        conseriesCons.update(result.ConseriesCons)
+        Log("   Read '"+fname+"': "+str(len(result.Pages))+" pages")
+
+    allFnames=[fnames[i] for i in sorted(fnames.keys())]
+
+    # Rebuild the pages dictionary in the original order.  When two files digest to the same page name, the later one wins, just as it does in a single-machine run.
+    pagesByWikiname: Dict[str, F3Page]={}
+    conseriesConsByWikiname: Dict[str, List[ConInfo]]={}
+    for i in sorted(pages.keys()):
+        page=pages[i]
+        pagesByWikiname[page.Name]=page
+        if i in conseriesCons.keys():
+            conseriesConsByWikiname[page.Name]=conseriesCons[i]
+        else:
+            conseriesConsByWikiname.pop(page.Name, None)
+
+    return allFnames, pagesByWikiname, conseriesConsByWikiname
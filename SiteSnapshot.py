@@ -0,0 +1,80 @@
+from __future__ import annotations
+from typing import List, Optional
+
+import os
+import json
+import struct
+
+from AsyncLog import Log
+
+# A single-file snapshot of the listing of the local copy of the site.
+# The local site is tens of thousands of small <name>.txt/<name>.xml file pairs, and just listing the directory and checking each entry is slow.
+# The snapshot holds the names of the pages and the site directory's mtime when it was made.  Adding, removing or renaming a file changes the
+# directory's mtime, so one stat of the directory tells us whether the listing is still good.  (Edits to existing files don't matter:
+# DigestPage() reads the pages' contents from the site itself.)
+#
+# Layout:
+#   magic (8 bytes)
+#   the site directory's mtime in ns, and the offset and length of the index (three little-endian 64-bit ints)
+#   the index: UTF-8 JSON [pagename, ...]
+
+snapshotMagic=b"F3SNAP2\n"
+snapshotHeader=struct.Struct("<8sqQQ")
+
+
+def SiteMtime(sitePath: str) -> int:
+    return os.stat(sitePath).st_mtime_ns
+
+
+# List the pages (the .txt files, without the extension) in sitePath
+def ListSite(sitePath: str) -> List[str]:
+    with os.scandir(sitePath) as entries:     # scandir gets is_file() from the directory listing on Windows, so there's no stat per file
+        return [entry.name[:-4] for entry in entries if entry.name.endswith(".txt") and entry.is_file()]
+
+
+# Write a snapshot of the pages in sitePath and return them
+def PackSite(sitePath: str, snapshotFname: str) -> List[str]:
+    mtime=SiteMtime(sitePath)     # Taken first, so a change made while we're listing makes the snapshot out of date rather than wrong
+    pageFnames=ListSite(sitePath)
+
+    indexBytes=json.dumps(pageFnames, ensure_ascii=False).encode("utf-8")
+    tmpFname=snapshotFname+".tmp"
+    with open(tmpFname, "wb") as f:
+        f.write(snapshotHeader.pack(snapshotMagic, mtime, snapshotHeader.size, len(indexBytes)))
+        f.write(indexBytes)
+    os.replace(tmpFname, snapshotFname)     # Don't leave a half-written snapshot where a reader might find it
+    Log("   Packed the list of "+str(len(pageFnames))+" pages in '"+sitePath+"' into '"+snapshotFname+"'")
+    return pageFnames
+
+
+#------------------------------------
+class SiteSnapshot:
+    def __init__(self, snapshotFname: str):
+        self.Fname=snapshotFname
+        with open(snapshotFname, "rb") as f:
+            contents=f.read()
+        magic, self.SiteMtime, indexOffset, indexLength=snapshotHeader.unpack_from(contents, 0)
+        if magic != snapshotMagic:
+            raise ValueError("SiteSnapshot: '"+snapshotFname+"' is not a site snapshot")
+        self._pageFnames: List[str]=json.loads(contents[indexOffset:indexOffset+indexLength].decode("utf-8"))
+
+    # Is the snapshot still a true listing of sitePath?
+    def IsCurrent(self, sitePath: str) -> bool:
+        return SiteMtime(sitePath) == self.SiteMtime
+
+    # The names of all the pages (the .txt files, without the extension), in the order in which they were listed
+    def PageFnames(self) -> List[str]:
+        return list(self._pageFnames)
+
+
+# Return the pages listed in the snapshot if there is one and it's current, and None otherwise
+def LoadSiteSnapshot(sitePath: str, snapshotFname: str) -> Optional[List[str]]:
+    if not os.path.isfile(snapshotFname):
+        Log("   No snapshot '"+snapshotFname+"'")
+        return None
+    snapshot=SiteSnapshot(snapshotFname)
+    if not snapshot.IsCurrent(sitePath):
+        Log("   Snapshot '"+snapshotFname+"' is out of date")
+        return None
+    Log("   snapshot='"+snapshotFname+"'")
+    return snapshot.PageFnames()
@@ -0,0 +1,106 @@
+from __future__ import annotations
+from typing import Dict, List, Set, Any, Callable, Optional
+from dataclasses import dataclass, field
+
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+
+from AsyncLog import Log
+
+# A small scheduler for the analysis passes.
+# Each pass (stage) declares the named data it reads (Inputs) and the named data it produces (Outputs).
+# A stage is started as soon as all of its inputs are available, so stages which don't depend on each other run concurrently on a thread pool.
+# When everything is done, the critical path -- the chain of dependent stages which bounds the total run time -- is logged.
+
+#------------------------------------
+@dataclass
+class Stage:
+    Name: str
+    Function: Callable[..., Optional[Dict[str, Any]]]     # Called with the inputs as keyword arguments; returns a dict containing the outputs
+    Inputs: List[str]=field(default_factory=list)
+    Outputs: List[str]=field(default_factory=list)
+    Start: float=0.0
+    End: float=0.0
+
+    @property
+    def Duration(self) -> float:
+        return self.End-self.Start
+
+
+# Run the stages.  data holds the values available at the start; the outputs of the stages are added to it as they are produced.
+def RunStages(stages: List[Stage], data: Dict[str, Any], maxWorkers: Optional[int]=None) -> None:
+    # Work out who produces what and check that every input will be available
+    producers: Dict[str, Stage]={}
+    for stage in stages:
+        for output in stage.Outputs:
+            if output in producers.keys() or output in data.keys():
+                raise ValueError("RunStages: '"+output+"' is produced by more than one stage")
+            producers[output]=stage
+    for stage in stages:
+        for input in stage.Inputs:
+            if input not in data.keys() and input not in producers.keys():
+                raise ValueError("RunStages: stage '"+stage.Name+"' needs '"+input+"', which nothing produces")
+
+    pending: List[Stage]=list(stages)
+    running: Dict[Future, Stage]={}
+    t0=time.perf_counter()
+
+    def Run(stage: Stage) -> Optional[Dict[str, Any]]:
+        stage.Start=time.perf_counter()-t0
+        try:
+            return stage.Function(**{input: data[input] for input in stage.Inputs})
+        finally:
+            stage.End=time.perf_counter()-t0
+
+    with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        while len(pending) > 0 or len(running) > 0:
+            # Start everything whose inputs are now all available
+            ready=[stage for stage in pending if all(input in data.keys() for input in stage.Inputs)]
+            for stage in ready:
+                pending.remove(stage)
+                running[executor.submit(Run, stage)]=stage
+            if len(running) == 0:
+                raise ValueError("RunStages: stages "+", ".join(s.Name for s in pending)+" depend on each other")
+
+            done, _=wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in done:
+                stage=running.pop(future)
+                outputs=future.result() or {}      # Re-raises any exception from the stage
+                for output in stage.Outputs:
+                    if output not in outputs.keys():
+                        raise ValueError("RunStages: stage '"+stage.Name+"' did not produce '"+output+"'")
+                    data[output]=outputs[output]
+
+    LogCriticalPath(stages, producers, time.perf_counter()-t0)
+
+
+# Find and log the longest chain of dependent stages
+def LogCriticalPath(stages: List[Stage], producers: Dict[str, Stage], elapsed: float) -> None:
+    # The cost of a stage's path is its own duration plus the cost of the most expensive path leading to it
+    cost: Dict[str, float]={}
+    previous: Dict[str, Optional[Stage]]={}
+    def Cost(stage: Stage) -> float:
+        if stage.Name not in cost.keys():
+            deps: Set[str]={producers[input].Name for input in stage.Inputs if input in producers.keys()}
+            before=[s for s in stages if s.Name in deps]
+            worst=max(before, key=Cost, default=None)
+            previous[stage.Name]=worst
+            cost[stage.Name]=stage.Duration+(Cost(worst) if worst is not None else 0.0)
+        return cost[stage.Name]
+
+    if len(stages) == 0:
+        return
+    last=max(stages, key=Cost)
+    path: List[Stage]=[]
+    stage: Optional[Stage]=last
+    while stage is not None:
+        path.insert(0, stage)
+        stage=previous[stage.Name]
+
+    Log("   Stages took "+Secs(elapsed)+" sec.  Critical path ("+Secs(cost[last.Name])+" sec): "+" -> ".join(s.Name+" ("+Secs(s.Duration)+")" for s in path))
+    for stage in sorted(stages, key=lambda s: s.Start):
+        Log("      "+stage.Name+": "+Secs(stage.Start)+" - "+Secs(stage.End)+" sec")
+
+
+def Secs(t: float) -> str:
+    return f"{t:.2f}"